@@ -0,0 +1,9 @@
+-- Trigram index on dataset names for Russtatdb.get_datasets_by_name().
+-- Substring searches ('%pattern%') can't use a B-tree index; pg_trgm lets the GIN index
+-- serve LIKE / ILIKE with leading wildcards. Creating the extension requires the CREATE
+-- privilege on the database (pg_trgm is a trusted extension since Postgres 13).
+-- Run outside a transaction block (CONCURRENTLY does not lock writes). clear_all(true)
+-- recreates the datasets table without this index: re-run this script afterwards.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS datasets_name_trgm_idx ON public.datasets USING gin (name gin_trgm_ops);
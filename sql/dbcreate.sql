@@ -364,6 +364,7 @@ begin
 	-- delete views
 	drop view public.all_data;
 	drop view public.all_datasets;
+	drop materialized view public.datasets_search;
 
 	-- delete obs, codevals, codes, datasets
 	drop table public.obs;
@@ -504,6 +505,8 @@ begin
 	ALTER TABLE ONLY public.obs
     	ADD CONSTRAINT obs_fk4 FOREIGN KEY (period_id) REFERENCES public.periods(id) 
 		ON UPDATE CASCADE ON DELETE CASCADE;
+	CREATE INDEX obs_dataset_year_idx ON public.obs (dataset_id, obs_year);
+	CREATE INDEX obs_code_year_idx ON public.obs (code_id, obs_year);
 		
 	-- clear other tables if "fullclear" == True
 	if fullclear then
@@ -573,6 +576,16 @@ begin
 		JOIN departments dept ON ds.dept_id = dept.id
 	ORDER BY cls.name, ds.name;
 	
+	-- recreate search view (refreshed by enable_triggers)
+	CREATE MATERIALIZED VIEW public.datasets_search AS
+		SELECT ds.id, (ds.search || cls.search || ag.search || dept.search) AS search
+		FROM public.datasets ds
+			JOIN public.classifier cls ON ds.class_id = cls.id
+			JOIN public.agencies ag ON ds.agency_id = ag.id
+			JOIN public.departments dept ON ds.dept_id = dept.id;
+	CREATE UNIQUE INDEX datasets_search_id_idx ON public.datasets_search (id);
+	CREATE INDEX datasets_search_search_idx ON public.datasets_search USING gin (search);
+	
 end;
 $$;
 
@@ -716,6 +729,8 @@ begin
 		set search = to_tsvector('russian', coalesce(val, ''))
 		where search is null;
 		
+		refresh materialized view concurrently public.datasets_search;
+		
 	end if;
 end;
 $$;
@@ -867,14 +882,14 @@ begin
 	SELECT ds.id, cls.name, ds.name, ds.updated_time, ds.prep_time, ds.next_update_time,
 			ds.description, ag.name, dept.name, ds.range_start, ds.range_end,
 			ds.prep_by, ds.prep_contact,
-			ts_rank((ds.search || cls.search || ag.search || dept.search), 
-					to_tsquery('russian', pattern)) as Ranking
-	FROM public.datasets ds
+			ts_rank(dss.search, to_tsquery('russian', pattern)) as Ranking
+	FROM public.datasets_search dss
+		JOIN public.datasets ds ON dss.id = ds.id
 		JOIN public.classifier cls ON ds.class_id = cls.id
 		JOIN public.agencies ag ON ds.agency_id = ag.id
 		JOIN public.departments dept ON ds.dept_id = dept.id
 	WHERE 
-		(ds.search || cls.search || ag.search || dept.search) @@ to_tsquery('russian', pattern)
+		dss.search @@ to_tsquery('russian', pattern)
 	ORDER BY 
 		Ranking desc, cls.name, ds.name;
 end;
@@ -1107,6 +1122,18 @@ CREATE VIEW public.all_datasets AS
   ORDER BY cls.name, ds.name;
 
 
+--
+-- Name: datasets_search; Type: MATERIALIZED VIEW; Schema: public; Owner: -
+--
+
+CREATE MATERIALIZED VIEW public.datasets_search AS
+	SELECT ds.id, (ds.search || cls.search || ag.search || dept.search) AS search
+	FROM public.datasets ds
+		JOIN public.classifier cls ON ds.class_id = cls.id
+		JOIN public.agencies ag ON ds.agency_id = ag.id
+		JOIN public.departments dept ON ds.dept_id = dept.id;
+
+
 --
 -- TOC entry 219 (class 1259 OID 26525)
 -- Name: character_entity; Type: TABLE; Schema: public; Owner: -
@@ -1458,6 +1485,20 @@ CREATE INDEX codevals_search_idx ON public.codevals USING gin (search);
 CREATE INDEX datasets_search_idx ON public.datasets USING gin (search);
 
 
+--
+-- Name: datasets_search_id_idx; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE UNIQUE INDEX datasets_search_id_idx ON public.datasets_search USING btree (id);
+
+
+--
+-- Name: datasets_search_search_idx; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX datasets_search_search_idx ON public.datasets_search USING gin (search);
+
+
 --
 -- TOC entry 3091 (class 1259 OID 17657)
 -- Name: departments_search_idx; Type: INDEX; Schema: public; Owner: -
@@ -1466,6 +1507,20 @@ CREATE INDEX datasets_search_idx ON public.datasets USING gin (search);
 CREATE INDEX departments_search_idx ON public.departments USING gin (search);
 
 
+--
+-- Name: obs_code_year_idx; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX obs_code_year_idx ON public.obs USING btree (code_id, obs_year);
+
+
+--
+-- Name: obs_dataset_year_idx; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX obs_dataset_year_idx ON public.obs USING btree (dataset_id, obs_year);
+
+
 --
 -- TOC entry 3106 (class 1259 OID 17665)
 -- Name: periods_search_idx; Type: INDEX; Schema: public; Owner: -
@@ -0,0 +1,8 @@
+-- Secondary indexes on public.obs for DBs created before they were added to dbcreate.sql.
+-- obs_unique1 starts with dataset_id, but filters by dataset and year, and every lookup
+-- by category (code_id) -- including cascaded deletes from codevals -- had to scan obs.
+-- Run outside a transaction block (CONCURRENTLY does not lock writes). Note that clear_all()
+-- of such older DBs recreates obs without these indexes: re-run this script afterwards.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS obs_dataset_year_idx ON public.obs (dataset_id, obs_year);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS obs_code_year_idx ON public.obs (code_id, obs_year);
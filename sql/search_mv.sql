@@ -0,0 +1,74 @@
+-- Materialized full-text index for search_datasets() -- apply ONCE to a DB created with an older
+-- dbcreate.sql or restored from dbbackup.backup (the current dbcreate.sql already includes it).
+-- search_datasets() used to concatenate the tsvectors of datasets, classifier, agencies and departments
+-- for every row on every call, which no index can serve. The concatenation is now stored in the
+-- materialized view datasets_search with a GIN index on it; the view is refreshed by enable_triggers()
+-- (when recalculating search vectors) and rebuilt by clear_all(). Datasets added with triggers enabled
+-- become searchable after the next refresh: Russtatdb.refresh_search() or enable_triggers()
+-- (russtat.update_db() makes one at the end). The refresh is CONCURRENTLY (using the unique index),
+-- so searches are not blocked while the view is rebuilt.
+
+CREATE MATERIALIZED VIEW public.datasets_search AS
+	SELECT ds.id, (ds.search || cls.search || ag.search || dept.search) AS search
+	FROM public.datasets ds
+		JOIN public.classifier cls ON ds.class_id = cls.id
+		JOIN public.agencies ag ON ds.agency_id = ag.id
+		JOIN public.departments dept ON ds.dept_id = dept.id;
+CREATE UNIQUE INDEX datasets_search_id_idx ON public.datasets_search (id);
+CREATE INDEX datasets_search_search_idx ON public.datasets_search USING gin (search);
+
+-- search_datasets(): probe the GIN index instead of scanning the join
+CREATE OR REPLACE FUNCTION public.search_datasets(pattern text) RETURNS TABLE(id integer, classificator text, dsname text, updated timestamp with time zone, preptime timestamp with time zone, nextupdate timestamp with time zone, description text, agency text, department text, startyr smallint, endyr smallint, prepby text, contact text, ranking real)
+    LANGUAGE plpgsql
+    AS $$
+begin 
+	RETURN QUERY
+	SELECT ds.id, cls.name, ds.name, ds.updated_time, ds.prep_time, ds.next_update_time,
+			ds.description, ag.name, dept.name, ds.range_start, ds.range_end,
+			ds.prep_by, ds.prep_contact,
+			ts_rank(dss.search, to_tsquery('russian', pattern)) as Ranking
+	FROM public.datasets_search dss
+		JOIN public.datasets ds ON dss.id = ds.id
+		JOIN public.classifier cls ON ds.class_id = cls.id
+		JOIN public.agencies ag ON ds.agency_id = ag.id
+		JOIN public.departments dept ON ds.dept_id = dept.id
+	WHERE 
+		dss.search @@ to_tsquery('russian', pattern)
+	ORDER BY 
+		Ranking desc, cls.name, ds.name;
+end;
+$$;
+
+-- enable_triggers(): refresh the view after recalculating the search vectors
+ALTER PROCEDURE public.enable_triggers(boolean) RENAME TO enable_search_triggers;
+
+CREATE PROCEDURE public.enable_triggers(recalc boolean DEFAULT true)
+    LANGUAGE plpgsql
+    AS $$
+begin
+	call public.enable_search_triggers(recalc);
+	if recalc then
+		refresh materialized view concurrently public.datasets_search;
+	end if;
+end;
+$$;
+
+-- clear_all(): the view depends on the datasets table, which clear_all() drops and recreates
+ALTER PROCEDURE public.clear_all(boolean) RENAME TO clear_all_tables;
+
+CREATE PROCEDURE public.clear_all(fullclear boolean DEFAULT true)
+    LANGUAGE plpgsql
+    AS $$
+begin
+	drop materialized view public.datasets_search;
+	call public.clear_all_tables(fullclear);
+	CREATE MATERIALIZED VIEW public.datasets_search AS
+		SELECT ds.id, (ds.search || cls.search || ag.search || dept.search) AS search
+		FROM public.datasets ds
+			JOIN public.classifier cls ON ds.class_id = cls.id
+			JOIN public.agencies ag ON ds.agency_id = ag.id
+			JOIN public.departments dept ON ds.dept_id = dept.id;
+	CREATE UNIQUE INDEX datasets_search_id_idx ON public.datasets_search (id);
+	CREATE INDEX datasets_search_search_idx ON public.datasets_search USING gin (search);
+end;
+$$;
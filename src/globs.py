@@ -5,8 +5,14 @@
 
 ## @package russtat.globs
 # @brief Global variables.
-from datetime import datetime, timedelta
-import sys
+from datetime import timedelta
+from time import perf_counter_ns
+import sys, json
+try:
+    # optional fast JSON encoder
+    import orjson
+except ImportError:
+    orjson = None
 
 # GNU General Public License v3.0+ (see LICENSE.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
 # --------------------------------------------------------------- #
@@ -27,6 +33,17 @@ def report(message, force=False, file=sys.stdout, end='\n', flush=False):
     if force or DEBUGGING:
         print(message, end=end, file=file, flush=flush)
 
+## Serializes an object to a JSON string keeping non-ASCII characters as is; 
+# objects not supported by JSON (e.g. dates) are converted with `str()`.
+# Uses [orjson](https://github.com/ijl/orjson) if it is installed (several times faster), 
+# otherwise the standard `json` module.
+# @param obj `object` object to serialize
+# @returns `str` JSON string
+def to_json(obj):
+    if orjson:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, default=str, separators=(',', ':'))
+
 ## Checks if an object is iterable (e.g. a collection or iterator).
 # @returns `bool` `True` if `obj` is iterable / `False` if not
 def is_iterable(obj):
@@ -34,18 +51,15 @@ def is_iterable(obj):
     try:
         _ = iter(obj)
         return True
-    except:
+    except TypeError:
         return False
 
 ## Timing decorator function.
 def timeit(f, printto=None, prefix='>>>> ELAPSED ', suffix=''):
     def wrapped(*args, **kwargs):
-        dt1 = datetime.now()
+        t0 = perf_counter_ns()
         res = f(*args, **kwargs)
-        dif = datetime.now() - dt1
-        if printto:
-            print(f"{prefix}{str(dif).split('.')[0]}{suffix}", file=printto)
-        else:
-            print(f"{prefix}{str(dif).split('.')[0]}{suffix}")
+        dif = timedelta(seconds=(perf_counter_ns() - t0) // 1000000000)
+        print(f"{prefix}{dif}{suffix}", file=printto or sys.stdout)
         return res
     return wrapped
@@ -7,8 +7,105 @@
 # @brief PostgreSQL manipulation class.
 import psycopg2
 from psycopg2 import DatabaseError
-import pandas as pd
-from globs import NL, report, is_iterable
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from psycopg2.extras import execute_values, RealDictCursor
+import os, threading, io, re, csv, gzip, atexit, weakref, time
+from contextlib import contextmanager
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
+from itertools import chain, count
+from uuid import uuid4
+from globs import NL, report, is_iterable, to_json
+
+## `dict` cursor result extractors for the `fetch` modes of Psdb::fetch()
+FETCHERS = {'iter': lambda cur: cur, 'list': lambda cur: cur.fetchall(), 'one': lambda cur: cur.fetchone()}
+
+## `dict` extra libpq connection parameters: TCP keepalives detect a dropped connection
+# in about a minute (instead of the OS default of hours) and the application name
+# identifies our sessions in `pg_stat_activity`
+CONN_OPTIONS = {'keepalives': 1, 'keepalives_idle': 30, 'keepalives_interval': 10, 'keepalives_count': 3,
+                'application_name': 'russtat'}
+
+## `int` maximum number of prepared statements kept per connection; the least recently
+# used ones are deallocated on the server -- see Psdb::_prepare()
+PREPARED_MAX = 100
+
+## `regex` psycopg2 placeholders (`%s`) and escaped percent signs (`%%`) in an SQL template
+PARAM_RE = re.compile(r'%([s%])')
+
+## Joins a sequence of SQL fragments; strings are returned as is.
+# @param x `str`|`iterable`|`None` fragment(s) to join
+# @param sep `str` separator
+# @returns `str` joined fragments ('' for an empty value)
+def _join(x, sep=', '):
+    if isinstance(x, str): return x
+    return sep.join(x) if x else ''
+
+## `str` whitespace trimmed from the classifier path levels, the same in SQL and Python
+# -- see CLASSIFICATOR_SQL and Russtatdb::build_classificator()
+CLASSIFIER_WS = ' \t\r\n'
+
+## `str` #CLASSIFIER_WS as a Postgres escape string literal
+_CLASSIFIER_WS_SQL = "E'" + CLASSIFIER_WS.encode('unicode_escape').decode('ascii') + "'"
+
+## `str` query returning the classificator tree as (path prefix array, dataset ID array) rows --
+# see Russtatdb::get_classificator(); `skip` is the number of leading path levels to drop,
+# `maxl` is the last path level to keep (`None` = all)
+CLASSIFICATOR_SQL = f"""
+with parts as (
+    select d.id, d.classifier,
+        array(select btrim(u.s, {_CLASSIFIER_WS_SQL}) from unnest(string_to_array(d.classifier, '/')) with ordinality as u(s, o)
+              where u.o > %(skip)s and (%(maxl)s::integer is null or u.o <= %(maxl)s::integer) order by u.o) as p
+    from public.all_datasets as d where d.classifier <> ''
+)
+select parts.p[1:i] as prefix, array_agg(parts.id order by parts.classifier, parts.id) as ids
+from parts, generate_subscripts(parts.p, 1) as i
+group by prefix;
+"""
+
+## `weakref.WeakSet` live Psdb objects, disconnected at interpreter exit -- see _disconnect_all()
+_instances = weakref.WeakSet()
+
+## Disconnects the DB objects still connected at interpreter exit
+# (before psycopg2 itself is torn down).
+@atexit.register
+def _disconnect_all():
+    for db in list(_instances):
+        db.disconnect()
+
+## `int` write buffer size of the export files in bytes
+EXPORT_BUFFER = 1024 * 1024
+
+## Opens an export file for writing (or passes an already open file through).
+# Paths ending with '.gz' are gzip-compressed on the fly.
+# @param file `str`|`os.PathLike`|`file object` file path or open text file (left open on exit)
+@contextmanager
+def _open_export(file):
+    if not isinstance(file, (str, os.PathLike)):
+        yield file
+        return
+    file = os.fspath(file)
+    if file.lower().endswith('.gz'):
+        with gzip.open(file, 'wt', newline='', encoding='utf-8', compresslevel=6) as f:
+            yield f
+    else:
+        with open(file, 'w', newline='', encoding='utf-8', buffering=EXPORT_BUFFER) as f:
+            yield f
+
+# --------------------------------------------------------------- # 
+
+## psycopg2 connection that remembers the statements prepared in its session.
+class PreparingConnection(psycopg2.extensions.connection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        ## `OrderedDict` names of the statements prepared on this connection, least recently
+        # used first -- see Psdb::_prepare()
+        self.prepared = OrderedDict()
+        ## `bool` whether the session settings have been applied -- see Psdb::con
+        self.initialized = False
 
 # --------------------------------------------------------------- # 
 
@@ -17,181 +114,599 @@ class Psdb:
 
     ## @param dbname `str` name / path of the Postgres DB on the server
     # @param user `str` Postgres DB user name (default = 'postgres')
-    # @param password `str`|`None` Postgres DB password (default = `None`, means it will be asked)
+    # @param password `str`|`None` Postgres DB password (default = `None`, means it is taken
+    # by libpq from the PGPASSWORD environment variable or the password file)
     # @param host `str` Postgres DB server location (default = localhost)
     # @param port `str` Postgres DB server port (default is 5432)
-    def __init__(self, dbname='russtat', user='postgres', password=None, host='127.0.0.1', port='5432'):
-        ## `Connection object` DB connection object
-        self.con = None  
+    # @param minconn `int` number of connections the pool opens on connect and keeps open:
+    # connections returned to the pool beyond this number are closed -- see fetch_concurrent()
+    # @param maxconn `int` maximum number of connections in the pool, i.e.
+    # the number of threads that can query the DB concurrently
+    # @param statement_timeout `int`|`None` server-side timeout for a single statement in milliseconds,
+    # after which the statement is aborted (default = `None`, no timeout)
+    # @param plan_cache_mode `str`|`None` value of the `plan_cache_mode` setting for the sessions
+    # (Postgres 12+): the default 'force_custom_plan' makes the server plan each execution of a
+    # prepared statement for its actual arguments instead of switching to a generic plan,
+    # which can be much slower on skewed data; `None` keeps the server setting
+    def __init__(self, dbname='russtat', user='postgres', password=None, host='127.0.0.1', port='5432',
+                 minconn=1, maxconn=10, statement_timeout=None, plan_cache_mode='force_custom_plan'):
+        ## `ThreadedConnectionPool` DB connection pool (`None` if not connected)
+        self.pool = None
+        ## `threading.local` holder of the connection checked out by the current thread
+        # and of the pool it was checked out from
+        self._local = threading.local()
         ## `tuple` DB connection parameters (saved on successful connection)
         self._connparams = None
+        ## `int` minimum / maximum number of pooled connections
+        self.minconn, self.maxconn = minconn, maxconn
+        ## `int`|`None` statement timeout in milliseconds
+        self.statement_timeout = statement_timeout
+        ## `str`|`None` plan cache mode of the sessions
+        self.plan_cache_mode = plan_cache_mode
+        _instances.add(self)
         self.connect(dbname=dbname, user=user, password=password, host=host, port=port)
 
-    ## Destructor: ensures safe DB disconnect.
-    def __del__(self):
+    ## Context manager entry: returns the connected DB object, e.g.
+    # ```
+    # with Psdb(password='...') as db:
+    #     rows = db.fetch('select 1', fetch='list')
+    # ```
+    def __enter__(self):
+        return self
+
+    ## Context manager exit: ensures safe DB disconnect.
+    def __exit__(self, exc_type, exc_value, traceback):
         self.disconnect()
 
+    ## `Connection object` DB connection of the current thread (`None` if not connected).
+    # Each thread checks out its own connection from Psdb::pool on first access
+    # and keeps it until release() or disconnect() is called.
+    # @exception `PoolError` all Psdb::maxconn connections are taken by other threads
+    @property
+    def con(self):
+        if self.pool is None: return None
+        con = getattr(self._local, 'con', None)
+        if con is not None and getattr(self._local, 'pool', None) is not self.pool:
+            # checked out from a pool closed by disconnect() / reconnect in another thread
+            if not con.closed: con.close()
+            con = self._local.con = None
+        if con is None or con.closed:
+            # a dead connection must be given back, or the pool loses its slot for good
+            self._local.con = None
+            if con is not None: self.pool.putconn(con, close=True)
+            con = self.pool.getconn()
+            # pooled idle connections can be dropped by the server as well
+            while con.closed:
+                self.pool.putconn(con, close=True)
+                con = self.pool.getconn()
+            if not con.initialized: self._init_connection(con)
+            self._local.con, self._local.pool = con, self.pool
+        return con
+
+    ## Applies the session settings to a newly opened pooled connection.
+    # @param con `Connection object` connection to set up
+    def _init_connection(self, con):
+        if self.plan_cache_mode and con.server_version >= 120000:
+            with con.cursor() as cur:
+                cur.execute("set plan_cache_mode = %s;", (self.plan_cache_mode,))
+            con.commit()
+        con.initialized = True
+
+    ## Sets up the Psdb::minconn connections opened by the pool on connect, so that
+    # the first queries of each thread get a ready connection.
+    def _warm_up(self):
+        cons = [self.pool.getconn() for _ in range(self.minconn)]
+        try:
+            for con in cons:
+                if not con.initialized: self._init_connection(con)
+        finally:
+            for con in cons: self.pool.putconn(con)
+
+    ## Returns the connection of the current thread to the pool, committing pending changes
+    # (a failed transaction is rolled back; nothing is sent if no transaction is open).
+    def release(self):
+        con = getattr(self._local, 'con', None)
+        self._local.con = None
+        if con is None: return
+        if self.pool is None or getattr(self._local, 'pool', None) is not self.pool:
+            # the connection's own pool is gone: just drop the connection
+            if not con.closed: con.close()
+            return
+        try:
+            if not con.closed:
+                status = con.get_transaction_status()
+                if status == TRANSACTION_STATUS_INTRANS:
+                    con.commit()
+                elif status != TRANSACTION_STATUS_IDLE:
+                    con.rollback()
+        finally:
+            self.pool.putconn(con)
+
+    ## Context manager that scopes the connection of the current thread to a block:
+    # the connection is given back to the pool on exit -- see release(). Use it
+    # in short-lived worker threads so they don't hold pooled connections, e.g.
+    # ```
+    # def worker(db, query):
+    #     with db.session():
+    #         return db.findin_datasets(query, fetch='list')
+    # ```
+    # @returns `Connection object` connection of the current thread
+    @contextmanager
+    def session(self):
+        try:
+            yield self.con
+        finally:
+            self.release()
+
     ## Connects to the DB using the given parameters.
     # @param reconnect `bool` if forced reconnect is required
     # @param dbname `str` name / path of the Postgres DB on the server
     # @param user `str` Postgres DB user name (default = 'postgres')
-    # @param password `str`|`None` Postgres DB password (default = None, means it will be asked)
+    # @param password `str`|`None` Postgres DB password (default = None, means it is taken
+    # by libpq from the PGPASSWORD environment variable or the password file)
     # @param host `str` Postgres DB server location (default = localhost)
     # @param port `str` Postgres DB server port (default is 5432)
     def connect(self, reconnect=False, dbname='russtat', user='postgres', password=None, host='127.0.0.1', port='5432'):
-        if not self.con is None and not reconnect:
+        if not self.pool is None and not reconnect:
             return True
-        if password is None:
-            password = input('>> Enter password:')
         try:
             self.disconnect()
-            self.con = psycopg2.connect(database=dbname, user=user, password=password, host=host, port=port)
+            options = {'options': f'-c statement_timeout={int(self.statement_timeout)}'} if self.statement_timeout else {}
+            self.pool = ThreadedConnectionPool(self.minconn, self.maxconn, database=dbname, user=user, 
+                                               password=password, host=host, port=port, 
+                                               connection_factory=PreparingConnection, **CONN_OPTIONS, **options)
             self._connparams = (dbname, user, password, host, port)
+            self._warm_up()
             report(f'Connected to {self._connparams[0]} as {self._connparams[1]} at {self._connparams[3]}:{self._connparams[4]}')
             return True
         except Exception as err:
-            self.con = None
+            # close the connections already opened, e.g. if the warm-up failed
+            if self.pool is not None:
+                try:
+                    self.pool.closeall()
+                except Exception:
+                    pass
+            self.pool = None
             print(err)
         return False
 
-    ## Disconnects from the DB.
+    ## Disconnects from the DB, closing all the pooled connections.
     def disconnect(self):
-        if self.con is None: return True
+        if self.pool is None: return True
         try:
-            self.con.commit()
-            self.con.close()
-            self.con = None
+            self.release()
+        except Exception as err:
+            report(f'Error releasing DB connection: {err}', force=True)
+        try:
+            self.pool.closeall()
+            self.pool = None
             report(f'Disconnected from {self._connparams[0] if self._connparams else "DB"}')
             return True
-        except:
-            pass
+        except Exception as err:
+            report(f'Error disconnecting from DB: {err}', force=True)
         return False
 
+    ## Connects with the last successful (or default) parameters unless already connected.
+    # @returns `bool` `True` if connected
+    def _ensure_connected(self):
+        if self.pool is not None: return True
+        params = [False] + list(self._connparams) if self._connparams else [False, 'russtat', 'postgres', None, '127.0.0.1', '5432']
+        return self.connect(*params)
+
     ## Executes an SQL / PSQL script / command.
     # @param sql `str` SQL / PSQL script
     # @param exec_params `tuple`|`None` SQL / PSQL arguments or `None` if no arguments
     # @param commit `bool` whether to commit changes after executing
+    # @param name `str`|`None` name of a server-side cursor to create (`None` = client-side cursor);
+    # a server-side cursor is closed by the next commit on this connection
+    # @param itersize `int` number of rows a server-side cursor fetches per network round-trip
+    # @param prepare `bool` run the query as a server-side prepared statement: the statement is
+    # parsed and planned once per connection and then only executed with new `exec_params`;
+    # up to #PREPARED_MAX statements are kept per connection
+    # (ignored for server-side cursors)
+    # @param cursor_factory `type`|`None` cursor class to create, e.g. `psycopg2.extras.RealDictCursor`
+    # (`None` = default cursor returning tuples)
     # @returns `Cursor object` current DB cursor
-    def exec(self, sql, exec_params=None, commit=False, on_error=print):
-        params = [False] + list(self._connparams) if self._connparams else [False, 'russtat', 'postgres', None, '127.0.0.1', '5432']
-        if not self.connect(*params):
+    def exec(self, sql, exec_params=None, commit=False, on_error=print, name=None, itersize=2000, prepare=False,
+             cursor_factory=None):
+        if not self._ensure_connected():
             return None
-        cur = self.con.cursor()
         try:
+            con = self.con
+        except PoolError as err:
+            if on_error: on_error(str(err))
+            return None
+        if name:
+            cur = con.cursor(name=name, cursor_factory=cursor_factory)
+            cur.itersize = itersize
+        else:
+            cur = con.cursor(cursor_factory=cursor_factory)
+        try:
+            if prepare and not name:
+                sql = self._prepare(cur, sql, len(exec_params) if exec_params else 0)
             if exec_params:
                 cur.execute(sql, exec_params)
             else:
                 cur.execute(sql)
             if commit:
-                self.con.commit()
+                con.commit()
             return cur
         except (Exception, DatabaseError) as err:
             if on_error: 
-                on_error(f"{str(err)}{NL}ORIGINAL QUERY:{NL}{cur.query.decode('utf-8')}")
+                on_error(f"{str(err)}{NL}ORIGINAL QUERY:{NL}{cur.query.decode('utf-8') if cur.query else sql}")
             return None
 
+    ## Prepares an SQL template on the cursor's connection (once per connection).
+    # @param cur `Cursor object` cursor to prepare the statement with
+    # @param sql `str` SQL template with psycopg2 `%s` placeholders
+    # @param nparams `int` number of query arguments
+    # @returns `str` SQL executing the prepared statement with `%s` placeholders for the arguments
+    def _prepare(self, cur, sql, nparams):
+        sql = sql.strip().rstrip(';')
+        name = 'rs_' + md5(sql.encode('utf-8')).hexdigest()[:16]
+        prepared = cur.connection.prepared
+        if name in prepared:
+            prepared.move_to_end(name)
+        else:
+            # the SQL text varies with limit / offset / columns, so keep the cache bounded
+            while len(prepared) >= PREPARED_MAX:
+                cur.execute(f"deallocate {prepared.popitem(last=False)[0]};")
+            i = count(1)
+            cur.execute(f"prepare {name} as " + PARAM_RE.sub(lambda m: f'${next(i)}' if m.group(1) == 's' else '%', sql))
+            prepared[name] = None
+        return f"execute {name}({', '.join(['%s'] * nparams)});" if nparams else f"execute {name};"
+
     ## Fetches the result(s) of an SQL / PSQL command.
     # @param sql `str` SQL / PSQL script
+    # @param exec_params `tuple`|`None` SQL / PSQL arguments or `None` if no arguments
     # @param fetch `str` one of:
     #   - 'iter': return iterator (cursor)
     #   - 'list': return results as a Python list (of tuples)
     #   - 'one': return single result (tuple)
+    #   - 'stream': return iterator over a server-side cursor fetching `itersize` rows at a time
     #   - 'dry': dry-run: return SQL query string
+    # @param prepare `bool` run the query as a prepared statement -- see exec()
     # @returns `Iterator`|`list`|`tuple` depending on the `fetch` parameter above
-    def fetch(self, sql, fetch='iter', get_header=False, on_error=print):
+    def fetch(self, sql, fetch='iter', get_header=False, on_error=print, itersize=2000, exec_params=None, prepare=False):
         if fetch == 'dry':
-            return self.con.cursor().mogrify(sql)
-        cur = self.exec(sql, on_error=on_error)
+            with self.con.cursor() as cur:
+                return cur.mogrify(sql, exec_params)
+        if fetch == 'stream':
+            cur = self.exec(sql, exec_params, on_error=on_error, name=f'rs_{uuid4().hex}', itersize=itersize)
+            if cur is None: return None
+            if not get_header: return cur
+            # server-side cursors get their description only after the first fetch
+            first = cur.fetchone()
+            return (self._get_column_names(cur), chain((first,), cur) if first else iter(()))
+        cur = self.exec(sql, exec_params, on_error=on_error, prepare=prepare)
         if cur is None: return None
-        foo = {'list': cur.fetchall, 'one': cur.fetchone}
-        if fetch in foo:
-            return (self._get_column_names(cur), foo[fetch]()) if get_header else foo[fetch]()
-        else:
+        if fetch not in ('list', 'one'):
             return (self._get_column_names(cur), cur) if get_header else cur
+        # 'list' and 'one' results are read at once: close the cursor to free its raw result
+        with cur:
+            res = FETCHERS[fetch](cur)
+            return (self._get_column_names(cur), res) if get_header else res
+
+    def fetch_dict(self, sql, on_error=print, exec_params=None):
+        cur = self.exec(sql, exec_params, on_error=on_error)
+        if cur is None: return None
+        with cur:
+            names = self._get_column_names(cur)
+            rows = cur.fetchall()
+        if not rows: return {n: [] for n in names}
+        return {n: list(col) for n, col in zip(names, zip(*rows))}
+
+    ## Fetches the result(s) of an SQL query as dictionaries keyed by column names;
+    # the rows are built by psycopg2 (`RealDictCursor`) as they are read.
+    # @param prepare `bool` run the query as a prepared statement -- see exec()
+    # @returns `Iterator` of `dict` rows (cursor) or `None` on failure
+    def fetch_records(self, sql, on_error=print, exec_params=None, prepare=False):
+        return self.exec(sql, exec_params, on_error=on_error, prepare=prepare, cursor_factory=RealDictCursor)
 
-    def fetch_dict(self, sql, on_error=print):
-        cur = self.exec(sql, on_error=on_error)
+    ## Fetches the result(s) of an SQL query as a pandas DataFrame.
+    # @param itersize `int`|`None` if given, the rows are read through a server-side cursor
+    # `itersize` rows at a time and each chunk is converted to a DataFrame as it arrives,
+    # so the full result never exists as Python rows all at once
+    # @returns `pandas.DataFrame`|`None`
+    def fetch_dataframe(self, sql, on_error=print, exec_params=None, itersize=None):
+        # pandas is heavy to import and only needed here
+        import pandas as pd
+        if itersize:
+            chunks = list(self.fetch_dataframe_chunks(sql, itersize, on_error, exec_params))
+            if not chunks: return None
+            return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        cur = self.exec(sql, exec_params, on_error=on_error)
         if cur is None: return None
-        names = self._get_column_names(cur)
-        data = {n: [] for n in names}
-        for row in cur:
-            for i, n in enumerate(names):
-                data[n].append(row[i])
-        return data
+        with cur:
+            return pd.DataFrame.from_records(cur.fetchall(), columns=self._get_column_names(cur))
+
+    ## Fetches the result(s) of an SQL query as a pandas DataFrame using `COPY ... TO STDOUT`:
+    # the server streams the rows as CSV which pandas parses in C. Fastest for
+    # very large results, but the column types are inferred from the CSV text.
+    # @returns `pandas.DataFrame`|`None`
+    def fetch_dataframe_copy(self, sql, on_error=print, exec_params=None):
+        if not self._ensure_connected(): return None
+        import pandas as pd
+        cur = self.con.cursor()
+        try:
+            if exec_params:
+                sql = cur.mogrify(sql, exec_params).decode('utf-8')
+            buf = io.StringIO()
+            cur.copy_expert(f"copy ({sql.strip().rstrip(';')}) to stdout with (format csv, header)", buf)
+            buf.seek(0)
+            return pd.read_csv(buf)
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(f"{str(err)}{NL}ORIGINAL QUERY:{NL}{sql}")
+            return None
+
+    ## Iterates over the result(s) of an SQL query in chunks read through a server-side cursor,
+    # so only one chunk is held in memory at a time. Server-side cursors live inside a
+    # transaction: don't use them on a connection in autocommit mode and don't commit on this
+    # thread's connection until the iteration is over.
+    # @param chunksize `int` number of rows per chunk (and per network round-trip)
+    # @returns `generator` of `list` row chunks (tuples)
+    def fetch_chunks(self, sql, chunksize=10000, on_error=print, exec_params=None):
+        cur = self.exec(sql, exec_params, on_error=on_error, name=f'rs_{uuid4().hex}', itersize=chunksize)
+        if cur is None: return
+        try:
+            rows = cur.fetchmany(chunksize)
+            while rows:
+                yield rows
+                rows = cur.fetchmany(chunksize)
+        finally:
+            if not cur.closed: cur.close()
 
-    def fetch_dataframe(self, sql, on_error=print):
-        res = self.fetch_dict(sql, on_error)
-        return pd.DataFrame(res) if res else None
+    ## Iterates over the result(s) of an SQL query as pandas DataFrames of up to `chunksize` rows
+    # -- see fetch_chunks(). A query returning no rows yields a single empty DataFrame.
+    # @returns `generator` of `pandas.DataFrame`
+    def fetch_dataframe_chunks(self, sql, chunksize=10000, on_error=print, exec_params=None):
+        import pandas as pd
+        cur = self.exec(sql, exec_params, on_error=on_error, name=f'rs_{uuid4().hex}', itersize=chunksize)
+        if cur is None: return
+        try:
+            rows = cur.fetchmany(chunksize)
+            # server-side cursors get their description only after the first fetch
+            names = self._get_column_names(cur)
+            if not rows:
+                yield pd.DataFrame(columns=names)
+            while rows:
+                yield pd.DataFrame.from_records(rows, columns=names)
+                rows = cur.fetchmany(chunksize)
+        finally:
+            if not cur.closed: cur.close()
+
+    ## Exports the result(s) of an SQL query to a CSV file, streaming the rows from a
+    # server-side cursor chunk by chunk: no DataFrame is built, so the memory use
+    # does not depend on the size of the result.
+    # @param file `str`|`os.PathLike`|`file object` output file path ('.gz' = gzip-compressed) or open text file
+    # @param delimiter `str` field delimiter
+    # @param header `bool` whether to write the column names as the first row
+    # @param chunksize `int` number of rows per network round-trip
+    # @returns `int` number of rows written or `None` on failure
+    def export_csv(self, sql, file, exec_params=None, delimiter=';', header=True, chunksize=10000, on_error=print):
+        cur = self.exec(sql, exec_params, on_error=on_error, name=f'rs_{uuid4().hex}', itersize=chunksize)
+        if cur is None: return None
+        try:
+            with _open_export(file) as f:
+                writer = csv.writer(f, delimiter=delimiter)
+                rows = cur.fetchmany(chunksize)
+                # server-side cursors get their description only after the first fetch
+                if header: writer.writerow(self._get_column_names(cur))
+                n = 0
+                while rows:
+                    writer.writerows(rows)
+                    n += len(rows)
+                    rows = cur.fetchmany(chunksize)
+                return n
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(str(err))
+            return None
+        finally:
+            if not cur.closed: cur.close()
+
+    ## Exports the result(s) of an SQL query to a CSV file with `COPY ... TO STDOUT`:
+    # the server formats the CSV itself and the client only copies the stream into the file.
+    # This is the fastest export path -- see also export_csv().
+    # @param file `str`|`os.PathLike`|`file object` output file path ('.gz' = gzip-compressed) or open text file
+    # @param delimiter `str` single-character field delimiter
+    # @param header `bool` whether to write the column names as the first row
+    # @returns `bool` `True` on success / `False` on failure
+    def export_csv_copy(self, sql, file, exec_params=None, delimiter=';', header=True, on_error=print):
+        if len(delimiter) != 1 or delimiter in "'\\":
+            if on_error: on_error(f'Invalid CSV delimiter: {delimiter!r}')
+            return False
+        if not self._ensure_connected(): return False
+        cur = self.con.cursor()
+        try:
+            if exec_params:
+                sql = cur.mogrify(sql, exec_params).decode('utf-8')
+            with _open_export(file) as f:
+                cur.copy_expert(f"copy ({sql.strip().rstrip(';')}) to stdout with "
+                                f"(format csv, header {str(bool(header)).lower()}, delimiter '{delimiter}')", f)
+            return True
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(f"{str(err)}{NL}ORIGINAL QUERY:{NL}{sql}")
+            return False
+        finally:
+            cur.close()
+
+    ## Exports the result(s) of an SQL query to a JSON file as a list of objects
+    # keyed by column names, streaming the rows like export_csv().
+    # @param file `str`|`os.PathLike`|`file object` output file path ('.gz' = gzip-compressed) or open text file
+    # @param chunksize `int` number of rows per network round-trip
+    # @returns `int` number of rows written or `None` on failure
+    def export_json(self, sql, file, exec_params=None, chunksize=10000, on_error=print):
+        cur = self.exec(sql, exec_params, on_error=on_error, name=f'rs_{uuid4().hex}', itersize=chunksize)
+        if cur is None: return None
+        try:
+            with _open_export(file) as f:
+                rows = cur.fetchmany(chunksize)
+                names = self._get_column_names(cur)
+                f.write('[')
+                n = 0
+                while rows:
+                    for row in rows:
+                        f.write(',\n' if n else '\n')
+                        f.write(to_json(dict(zip(names, row))))
+                        n += 1
+                    rows = cur.fetchmany(chunksize)
+                f.write('\n]\n' if n else ']\n')
+                return n
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(str(err))
+            return None
+        finally:
+            if not cur.closed: cur.close()
 
     def sqlquery(self, table, columns='*', distinct=True, joins=None, condition=None, conj='and',
                 groupby=None, having=None, window=None, union=None, orderby=None,
                 limit=None, offset=None,
                 schema='public', fetch='iter', **kwargs):
-        if is_iterable(columns): columns = ', '.join(columns)
-        if is_iterable(condition): 
-            condition = f' {conj} '.join(f"({c})" for c in condition)
+        columns = _join(columns)
+        if isinstance(condition, str):
+            condition = f"where ({condition})" if condition else ''
         elif condition:
-            condition = f"({condition})"
-        condition = f"where {condition}" if condition else ''
+            condition = 'where ' + f' {conj} '.join(f"({c})" for c in condition)
+        else:
+            condition = ''
         distinct = ' distinct' if distinct else ''
         limit = f'limit {limit}' if limit else ''
         offset = f'offset {offset}' if offset else ''
-        joins = '\n'.join(joins) if is_iterable(joins) else (joins or '')
-        if groupby:
-            if is_iterable(groupby): 
-                groupby = ', '.join(groupby)
-            groupby = f"group by {groupby}"
-        else:
-            groupby = ''
-        if having:
-            if is_iterable(having): 
-                having = ', '.join(having)
-            having = f"having {having}"
-        else:
-            having = ''
+        joins = _join(joins, '\n')
+        groupby = f"group by {_join(groupby)}" if groupby else ''
+        having = f"having {_join(having)}" if having else ''
         window = window or ''
         union = union or ''
-        if orderby:
-            if is_iterable(orderby): 
-                orderby = ', '.join(orderby)
-            orderby = f"order by {orderby}"
-        else:
-            orderby = ''
+        orderby = f"order by {_join(orderby)}" if orderby else ''
         if schema: table = f'{schema}.{table}'
 
-        q = f"select{distinct} {columns} from {table} {joins} {condition} "\
-            f"{groupby} {having} {window} {union} {orderby} "\
-            f"{limit} {offset}".strip() + ';'
-        while '  ' in q: q = q.replace('  ', ' ')
+        q = ' '.join(part for part in (f"select{distinct} {columns} from {table}", joins, condition, 
+                                      groupby, having, window, union, orderby, limit, offset) if part) + ';'
 
-        if fetch in ('dict', 'dataframe'):
-            foo = self.fetch_dict if fetch == 'dict' else self.fetch_dataframe
-            kwargs = {k: v for k, v in kwargs.items() if k in ['sql', 'on_error']}
+        if fetch == 'dict':
+            foo = self.fetch_dict
+            kwargs = {k: v for k, v in kwargs.items() if k in ['sql', 'on_error', 'exec_params']}
+        elif fetch == 'records':
+            foo = self.fetch_records
+            kwargs = {k: v for k, v in kwargs.items() if k in ['sql', 'on_error', 'exec_params', 'prepare']}
+        elif fetch == 'dataframe':
+            foo = self.fetch_dataframe
+            kwargs = {k: v for k, v in kwargs.items() if k in ['sql', 'on_error', 'exec_params', 'itersize']}
         else:
             foo = self.fetch
+            kwargs['fetch'] = fetch
 
         return foo(q, **kwargs)
 
+    ## Iterates over the rows of a table / view page by page using keyset pagination:
+    # every next page is requested with `<key> > <last key of previous page>` rather
+    # than with OFFSET, so the server never re-reads the rows of the previous pages.
+    # @param table `str` table / view name (see sqlquery())
+    # @param key `str` unique sortable column to paginate by; must be among `columns`
+    # @param page_size `int` maximum number of rows per page
+    # @param columns `str`|`iterable` columns to select (see sqlquery())
+    # @param condition `str`|`iterable`|`None` extra filter condition(s) (see sqlquery());
+    # conditions must not contain literal `%` since the key is passed as a query parameter
+    # @returns `generator` of `list` pages of rows (tuples)
+    def sqlquery_pages(self, table, key='id', page_size=1000, columns='*', condition=None, **kwargs):
+        if condition is None:
+            conditions = []
+        elif is_iterable(condition):
+            conditions = list(condition)
+        else:
+            conditions = [condition]
+        idx, last = None, None
+        while True:
+            if last is None:
+                res = self.sqlquery(table, columns=columns, condition=conditions or None, orderby=key, 
+                                    limit=page_size, fetch='list', get_header=True, **kwargs)
+            else:
+                res = self.sqlquery(table, columns=columns, condition=conditions + [f"{key} > %s"], orderby=key, 
+                                    limit=page_size, fetch='list', get_header=True, exec_params=(last,), **kwargs)
+            if not res or not res[1]: return
+            header, rows = res
+            if idx is None: idx = header.index(key)
+            yield rows
+            if len(rows) < page_size: return
+            last = rows[-1][idx]
+
+    ## Runs independent queries concurrently, each in its own thread on its own pooled
+    # connection, so the total time is about that of the slowest query, e.g.
+    # ```
+    # datasets, classifiers = db.fetch_concurrent([('select * from search_datasets(%s::text);', ('вуз',)),
+    #                                              'select distinct classifier from all_datasets;'])
+    # ```
+    # @param queries `iterable` of `str` SQL or `tuple` (SQL, exec_params)
+    # @param fetch `str` 'list' or 'one' (see fetch()); results are read before the
+    # connections are returned to the pool
+    # @param max_workers `int`|`None` maximum number of queries run at once
+    # (default = Psdb::maxconn - 1, leaving a connection for the calling thread); the pool keeps only
+    # Psdb::minconn idle connections, so workers beyond that open a new connection (losing its
+    # prepared statements) on each call and close it afterwards: pass a larger `minconn` to the
+    # constructor to keep the worker connections warm
+    # @returns `list` query results in the order of `queries` (`None` for failed queries)
+    def fetch_concurrent(self, queries, fetch='list', on_error=print, max_workers=None):
+        queries = [(q, None) if isinstance(q, str) else tuple(q) for q in queries]
+        if not queries or not self._ensure_connected(): return [None] * len(queries)
+
+        def worker(query):
+            with self.session():
+                return self.fetch(query[0], fetch=fetch, on_error=on_error, exec_params=query[1])
+
+        with ThreadPoolExecutor(max_workers=min(max_workers or max(1, self.maxconn - 1), len(queries))) as executor:
+            return list(executor.map(worker, queries))
+
     def _get_column_names(self, cur):
-        return tuple(c.name for c in cur.description) if cur else tuple()
+        d = cur.description if cur else None
+        if d is None: return tuple()
+        return tuple(c[0] for c in d)
 
     def _get_dbtables(self, **kwargs):
         return self.sqlquery('dbtables', **kwargs)
     
     ## Overloaded `bool()` operator returns True if the DB connection is active, False otherwise.
     def __bool__(self):
-        return not self.con is None
+        return not self.pool is None
 
     ## Overloaded `()` operator returns current cursor object or `None` on failure.
     def __call__(self):
-        return None if self.con is None else self.con.cursor()
+        return None if self.pool is None else self.con.cursor()
 
 # --------------------------------------------------------------- # 
 
 class Russtatdb(Psdb):
 
-    def __init__(self, dbname='russtat', user='postgres', password=None, host='127.0.0.1', port='5432'):
-        super().__init__(dbname, user, password, host, port)
+    def __init__(self, dbname='russtat', user='postgres', password=None, host='127.0.0.1', port='5432',
+                 minconn=1, maxconn=10, statement_timeout=None, plan_cache_mode='force_custom_plan', cache_ttl=300):
+        super().__init__(dbname, user, password, host, port, minconn, maxconn, statement_timeout, plan_cache_mode)
+        ## `dict` cached classificator trees as (time, tree) keyed by the method name and arguments
+        self._classificator_cache = {}
+        ## `float`|`None` lifetime of the cached classificator trees in seconds (`None` = unlimited);
+        # bounds the staleness when the DB is updated by other processes
+        self.cache_ttl = cache_ttl
+        ## `dict` column names of the DB tables / views keyed by table name -- see _get_colnames()
+        self._colnames_cache = {}
+
+    ## Drops the cached classificator trees (called whenever the DB contents change).
+    def invalidate_cache(self):
+        self._classificator_cache.clear()
+
+    ## @returns cached classificator tree for `key` or `None` if missing or expired
+    def _get_cached(self, key):
+        entry = self._classificator_cache.get(key)
+        if entry is None: return None
+        if self.cache_ttl is not None and time.monotonic() - entry[0] > self.cache_ttl:
+            # another thread may have dropped the expired entry already
+            self._classificator_cache.pop(key, None)
+            return None
+        return entry[1]
+
+    def _set_cached(self, key, value):
+        self._classificator_cache[key] = (time.monotonic(), value)
 
     def dbmessages(self, default='Database Error'):
         return '\n'.join(self.con.notices) if self.con.notices else default
@@ -203,8 +718,24 @@ class Russtatdb(Psdb):
         preptime timestamp with time zone, nextupdate timestamp with time zone, 
         description text, agency text, department text, startyr smallint, 
         endyr smallint, prepby text, contact text, ranking real
+
+        Returns the `limit` (default 50) best ranked results starting from `offset`;
+        pass `limit=None` to get all the results.
+
+        The query is passed as a parameter, so a literal `%` in extra SQL such as
+        `condition` must be written as `%%`, e.g. `condition="dsname like '%%вуз%%'"`.
+
+        The search runs on the `datasets_search` materialized view (sql/search_mv.sql):
+        datasets added since its last refresh are not found until refresh_search()
+        or enable_triggers() is called.
         """
-        return self.sqlquery(f"search_datasets($${query}$$::text)", **kwargs)
+        kwargs.setdefault('limit', 50)
+        kwargs.setdefault('orderby', 'ranking desc, id')
+        # the search function returns unique rows, and 'select distinct' would require
+        # the order-by columns to be selected
+        kwargs.setdefault('distinct', False)
+        kwargs.setdefault('prepare', True)
+        return self.sqlquery('search_datasets(%s::text)', exec_params=(query,), **kwargs)
 
     def findin_data(self, query, **kwargs):
         """
@@ -215,15 +746,39 @@ class Russtatdb(Psdb):
         startyr smallint, endyr smallint, prepby text, contact text, 
         obsyear integer, obsperiod character varying, obsunit character varying, 
         obscode text, obscodeval text, value real, ranking real
+
+        Returns the `limit` (default 50) best ranked results starting from `offset`;
+        pass `limit=None` to get all the results.
+
+        The query is passed as a parameter, so a literal `%` in extra SQL such as
+        `condition` must be written as `%%`, e.g. `condition="dsname like '%%вуз%%'"`.
         """
-        return self.sqlquery(f"search_data($${query}$$::text)", **kwargs)
+        kwargs.setdefault('limit', 50)
+        kwargs.setdefault('orderby', 'ranking desc, id')
+        # the search function returns unique rows, and 'select distinct' would require
+        # the order-by columns to be selected
+        kwargs.setdefault('distinct', False)
+        kwargs.setdefault('prepare', True)
+        return self.sqlquery('search_data(%s::text)', exec_params=(query,), **kwargs)
 
     def get_datasets(self, **kwargs):
         return self.sqlquery('all_datasets', **kwargs)
 
+    ## Fetches the observations from the `all_data` view. By default the rows are streamed
+    # through a server-side cursor (`fetch='stream'`), which is closed by any commit on this
+    # thread's connection (add_data(), disable_triggers(), clear_all_data(), release(), end of
+    # session() etc.): don't call those until the iteration is over, or pass `fetch='iter'`.
+    # @returns `Iterator` of rows (cursor) -- see Psdb::sqlquery()
     def get_data(self, **kwargs):
+        kwargs.setdefault('fetch', 'stream')
         return self.sqlquery('all_data', **kwargs)
     
+    ## Adds a dataset to the DB. The dataset becomes visible to findin_datasets() only
+    # after the next refresh_search() or enable_triggers() call: refresh once after a batch
+    # of add_data() calls rather than after each of them.
+    # @param data_json `str` dataset JSON string
+    # @param disable_triggers `bool` whether to disable DB triggers for the duration of the call
+    # @returns `tuple` (n_added, last_data_id, dataset_id)
     def add_data(self, data_json, disable_triggers=False, on_error=print):
         if not data_json:
             report('NONE data!', force=True)
@@ -231,8 +786,9 @@ class Russtatdb(Psdb):
         triggers_disabled = False
         if disable_triggers:
             triggers_disabled = self.disable_triggers(on_error=on_error)        
-        cur = self.exec(f"select * from public.add_data($${data_json}$$::text);", commit=True, on_error=on_error)        
+        cur = self.exec("select * from public.add_data(%s::text);", (data_json,), commit=True, on_error=on_error)        
         if cur:
+            self.invalidate_cache()
             res = cur.fetchone()
             if triggers_disabled:
                 self.enable_triggers(on_error=on_error)
@@ -240,44 +796,201 @@ class Russtatdb(Psdb):
         else:
             raise Exception(self.dbmessages)
 
+    ## Adds many datasets at once, packing `page_size` add_data() calls into each statement
+    # and committing once at the end.
+    # @param data_jsons `iterable` of `str` dataset JSON strings (empty items are skipped)
+    # @param page_size `int` number of datasets sent per statement
+    # @param disable_triggers `bool` whether to disable DB triggers for the duration of the load
+    # @returns `list` of `tuple` (n_added, last_data_id, dataset_id) results, one per dataset,
+    # or `None` on failure
+    def add_data_many(self, data_jsons, page_size=500, disable_triggers=False, on_error=print):
+        if not self: return None
+        args = [(j,) for j in data_jsons if j]
+        if not args: return []
+        triggers_disabled = self.disable_triggers(on_error=on_error) if disable_triggers else False
+        cur = self.con.cursor()
+        try:
+            res = execute_values(cur, "select r.* from (values %s) as t(v) cross join lateral public.add_data(t.v::text) as r;",
+                                 args, page_size=page_size, fetch=True)
+            self.con.commit()
+            self.invalidate_cache()
+            return res
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(str(err))
+            return None
+        finally:
+            if triggers_disabled:
+                self.enable_triggers(on_error=on_error)
+
+    ## Bulk-inserts observations with already resolved foreign keys into the `obs` table,
+    # packing `page_size` rows into each INSERT statement. Existing observations
+    # (same dataset, code, unit, period and year) get their values updated.
+    # @param rows `iterable` of `tuple` (dataset_id, code_id, unit_id, period_id, obs_year, obs_val);
+    # rows must be unique by (dataset_id, code_id, unit_id, period_id, obs_year)
+    # @param page_size `int` number of rows sent per statement
+    # @param disable_triggers `bool` whether to disable DB triggers for the duration of the load
+    # @returns `bool` `True` on success / `False` on failure
+    def add_data_bulk(self, rows, page_size=1000, disable_triggers=False, on_error=print):
+        if not self: return False
+        triggers_disabled = self.disable_triggers(on_error=on_error) if disable_triggers else False
+        cur = self.con.cursor()
+        try:
+            execute_values(cur, "insert into public.obs(dataset_id, code_id, unit_id, period_id, obs_year, obs_val) "
+                                "values %s on conflict on constraint obs_unique1 do update set obs_val = excluded.obs_val;",
+                           rows, page_size=page_size)
+            self.con.commit()
+            self.invalidate_cache()
+            return True
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(str(err))
+            return False
+        finally:
+            if triggers_disabled:
+                self.enable_triggers(on_error=on_error)
+
+    ## Bulk-loads observations with already resolved foreign keys into the `obs` table
+    # using `COPY FROM STDIN`: the rows are copied into a temporary staging table
+    # which is then merged into `obs` with a single INSERT (updating existing observations).
+    # This is the fastest way to load large numbers of rows -- see also add_data_bulk().
+    # @param rows `iterable` of `tuple` (dataset_id, code_id, unit_id, period_id, obs_year, obs_val);
+    # rows must be unique by (dataset_id, code_id, unit_id, period_id, obs_year)
+    # @param disable_triggers `bool` whether to disable DB triggers for the duration of the load
+    # @returns `bool` `True` on success / `False` on failure
+    def bulk_copy_obs(self, rows, disable_triggers=False, on_error=print):
+        if not self: return False
+        buf = io.StringIO()
+        for row in rows:
+            buf.write('\t'.join(map(str, row)))
+            buf.write('\n')
+        buf.seek(0)
+        triggers_disabled = self.disable_triggers(on_error=on_error) if disable_triggers else False
+        cur = self.con.cursor()
+        try:
+            cur.execute("create temp table obs_stage (dataset_id integer, code_id integer, unit_id integer, "
+                        "period_id integer, obs_year integer, obs_val real) on commit drop;")
+            cur.copy_expert("copy obs_stage from stdin;", buf)
+            cur.execute("insert into public.obs(dataset_id, code_id, unit_id, period_id, obs_year, obs_val) "
+                        "select * from obs_stage on conflict on constraint obs_unique1 do update set obs_val = excluded.obs_val;")
+            self.con.commit()
+            self.invalidate_cache()
+            return True
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(str(err))
+            return False
+        finally:
+            if triggers_disabled:
+                self.enable_triggers(on_error=on_error)
+
+    ## Adds many datasets at once by copying the raw dataset JSONs into a temporary
+    # staging table with `COPY FROM STDIN` and running add_data() over the staged rows
+    # in a single statement -- see also add_data_many(). The whole load is one transaction.
+    # @param data_jsons `iterable` of `str` dataset JSON strings (empty items are skipped)
+    # @param disable_triggers `bool` whether to disable DB triggers for the duration of the load
+    # @returns `list` of `tuple` (n_added, last_data_id, dataset_id) results, one per dataset,
+    # or `None` on failure
+    def bulk_load_data(self, data_jsons, disable_triggers=False, on_error=print):
+        if not self: return None
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        for j in data_jsons:
+            if j: writer.writerow((j,))
+        if not buf.tell(): return []
+        buf.seek(0)
+        triggers_disabled = self.disable_triggers(on_error=on_error) if disable_triggers else False
+        cur = self.con.cursor()
+        try:
+            cur.execute("create temp table data_stage (n serial, v text) on commit drop;")
+            cur.copy_expert("copy data_stage(v) from stdin with (format csv);", buf)
+            cur.execute("select r.* from data_stage as s cross join lateral public.add_data(s.v) as r order by s.n;")
+            res = cur.fetchall()
+            self.con.commit()
+            self.invalidate_cache()
+            return res
+        except (Exception, DatabaseError) as err:
+            self.con.rollback()
+            if on_error: on_error(str(err))
+            return None
+        finally:
+            if triggers_disabled:
+                self.enable_triggers(on_error=on_error)
+
     def disable_triggers(self, on_error=print):
         cur = self.exec("call public.disable_triggers();", commit=True, on_error=on_error)
         return True if cur else False
 
+    ## Refreshes the `datasets_search` materialized view searched by findin_datasets().
+    # The view is rebuilt concurrently, so searches are not blocked meanwhile. DBs without
+    # the view (created before sql/search_mv.sql) are left as is.
+    # @returns `bool` `True` on success / `False` on failure
+    def refresh_search(self, on_error=print):
+        res = self.fetch("select to_regclass('public.datasets_search');", fetch='one', on_error=on_error)
+        if res is None: return False
+        if res[0] is None: return True
+        cur = self.exec("refresh materialized view concurrently public.datasets_search;", commit=True, on_error=on_error)
+        return True if cur else False
+
     def enable_triggers(self, reindex=True, on_error=print):
         cur = self.exec(f"call public.enable_triggers({int(reindex)}::boolean);", commit=True, on_error=on_error)
+        self.invalidate_cache()
         return True if cur else False
 
     def clear_all_data(self, full_clear=False, confirm_action=None, on_error=print):
         if confirm_action and not confirm_action():
             return False
         cur = self.exec(f"call public.clear_all({int(full_clear)}::boolean);", commit=True, on_error=on_error)
+        self.invalidate_cache()
         return True if cur else False
 
-    def get_classificator(self, ignore_root=True, max_levels=None):
-        dsets = self.sqlquery('all_datasets', columns=['classifier', 'id'], condition="classifier <> ''", orderby='classifier')
-        spl = [(tuple(s.strip() for s in x[0].split('/')[int(ignore_root):max_levels]), x[1]) for x in dsets]
-        st = set()
-        for el in spl:
-            for i in range(1, len(el[0]) + 1):
-                st.add(el[0][:i])
-        st = sorted(st)
-        tout = []
-        for t_new in st:
-            x = (t_new, [])
-            for t_src in spl:
-                l = len(t_new)
-                if l > len(t_src[0]): continue
-                if t_src[0][:l] == t_new:
-                    x[1].append(t_src[1])
-            tout.append(x)
-        return tout
-
-    def collect_classificator(self, ignore_root=True, max_levels=None, max_categories=None):
-        lst = self.get_classificator(ignore_root, max_levels)
+    ## Builds the classificator tree from dataset classifier paths.
+    # @param rows `iterable` of (`str`, `int`) '/'-separated classifier paths and dataset IDs
+    # @param ignore_root `bool` whether to skip the first (root) level of the paths
+    # @param max_levels `int`|`None` maximum depth of the tree (`None` = unlimited)
+    # @returns `list` of (`tuple`, `list`) classifier path prefixes (sorted) with the IDs of their datasets
+    @staticmethod
+    def build_classificator(rows, ignore_root=True, max_levels=None):
+        spl = [(tuple(s.strip(CLASSIFIER_WS) for s in x[0].split('/')[int(ignore_root):max_levels]), x[1]) for x in rows]
+        groups = defaultdict(list)
+        for path, ds_id in spl:
+            for i in range(1, len(path) + 1):
+                groups[path[:i]].append(ds_id)
+        return [(k, groups[k]) for k in sorted(groups)]
+
+    ## Gets the classificator tree: the classifier paths are split and aggregated
+    # by the server in one pass -- see build_classificator() for the result format.
+    # @param use_cache `bool` return the cached tree for the same arguments, if any
+    # (see collect_classificator())
+    def get_classificator(self, ignore_root=True, max_levels=None, use_cache=True):
+        key = ('tree', ignore_root, max_levels)
+        tree = self._get_cached(key) if use_cache else None
+        if tree is not None: return list(tree)
+        if max_levels is not None and max_levels < 0:
+            # negative (from the end) levels are only supported by the Python implementation
+            dsets = self.sqlquery('all_datasets', columns=['classifier', 'id'], condition="classifier <> ''", orderby='classifier')
+            tree = self.build_classificator(dsets, ignore_root, max_levels)
+        else:
+            rows = self.fetch(CLASSIFICATOR_SQL, fetch='list', exec_params={'skip': int(ignore_root), 'maxl': max_levels})
+            if rows is None: return []
+            tree = sorted((tuple(prefix), ids) for prefix, ids in rows)
+        self._set_cached(key, tree)
+        return list(tree)
+
+    ## Collects the classificator tree as a flat list of nodes (see print_classificator()).
+    # @param use_cache `bool` return the cached result for the same arguments, if any;
+    # the cache is reset by invalidate_cache() on every DB update and entries expire
+    # after Russtatdb::cache_ttl seconds
+    # @returns `list` of `dict` nodes: `{'level': int, 'name': str, 'count': int, 'id': int}`
+    def collect_classificator(self, ignore_root=True, max_levels=None, max_categories=None, use_cache=True):
+        key = ('collect', ignore_root, max_levels, max_categories)
+        results = self._get_cached(key) if use_cache else None
+        if results is not None: return list(results)
+        lst = self.get_classificator(ignore_root, max_levels, use_cache)[:max_categories]
+        dsnames = self.get_dataset_names({ds_id for el in lst for ds_id in el[1]})
         l = {}
         results = []
-        for el in lst[:max_categories]:
+        for el in lst:
             le = len(el[1])
 
             j = 0
@@ -288,15 +1001,11 @@ class Russtatdb(Psdb):
                 l[i] = el[0][i]
                 j = i + 1    
 
-            if le:                
-                dsets = el[1]
-                dsnames = (x[0] for x in self.get_datasets_by_ids(dsets, columns='dataset'))
-                dsets = zip(dsets, dsnames)
+            for ds_id in el[1]:
+                results.append({'level': j, 'name': dsnames.get(ds_id, ''), 'count': 1, 'id': ds_id})
 
-                for ds in dsets:
-                    results.append({'level': j, 'name': ds[1], 'count': 1, 'id': ds[0]})
-        
-        return results              
+        self._set_cached(key, results)
+        return list(results)              
 
     def print_classificator(self, ignore_root=True, max_levels=None, max_categories=None, 
         print_names=True, print_ids=True, max_ds=10, indent='  ', file=None):
@@ -306,9 +1015,11 @@ class Russtatdb(Psdb):
             else:
                 print(w, file=file)
 
-        lst = self.get_classificator(ignore_root, max_levels)
+        lst = self.get_classificator(ignore_root, max_levels)[:max_categories]
+        if print_names:
+            dsnames = self.get_dataset_names({ds_id for el in lst for ds_id in (el[1][:max_ds] if isinstance(max_ds, int) else el[1])})
         l = {}
-        for el in lst[:max_categories]:
+        for el in lst:
             for i in range(len(el[0])):
                 if l.get(i, '') == el[0][i]:
                     continue            
@@ -319,8 +1030,7 @@ class Russtatdb(Psdb):
                 trunc = isinstance(max_ds, int) and le > max_ds
                 dsets = el[1][:max_ds] if trunc else el[1]
                 if print_names:
-                    dsnames = (x[0] for x in self.get_datasets_by_ids(dsets, columns='dataset'))
-                    dsets = zip(dsets, dsnames)
+                    dsets = ((ds_id, dsnames.get(ds_id, '')) for ds_id in dsets)
                 for ds in dsets:
                     if print_ids:
                         pr(f"{indent * (i + 1)}{ds[0]}: {ds[1]}" if print_names else f"{indent * i}{ds}")
@@ -334,32 +1044,59 @@ class Russtatdb(Psdb):
 
     def get_datasets_by_ids(self, ids, **kwargs):
         if ids:
-            return self.get_datasets(condition=f"id in ({repr(ids)[1:-1]})", **kwargs)
+            kwargs.setdefault('prepare', True)
+            return self.get_datasets(condition="id = any(%s)", exec_params=(list(ids),), **kwargs)
         else:
             return self.get_datasets(**kwargs)
     
+    ## Gets the names of the given datasets in a single query.
+    # @param ids `iterable` of `int` dataset IDs
+    # @returns `dict` dataset names keyed by dataset ID
+    def get_dataset_names(self, ids):
+        ids = list(ids)
+        if not ids: return {}
+        rows = self.get_datasets_by_ids(ids, columns=['id', 'dataset'], fetch='list')
+        return dict(rows) if rows else {}
+    
     def get_datasets_by_name(self, pattern, fullmatch=False, case_sensitive=False, **kwargs):
         ds, pat = ('dataset', pattern) if case_sensitive else ('lower(dataset)', pattern.lower())
         if fullmatch:
-            return self.get_datasets(condition=f"{ds} = $${pat}$$", **kwargs)
+            return self.get_datasets(condition=f"{ds} = %s", exec_params=(pat,), **kwargs)
         else:
-            return self.get_datasets(condition=f"{ds} like $$%{pat}%$$", **kwargs)
+            # (I)LIKE can use the trigram index on dataset names (see sql/datasets_trgm.sql)
+            op = 'like' if case_sensitive else 'ilike'
+            return self.get_datasets(condition=f"dataset {op} %s", exec_params=(f'%{pattern}%',), **kwargs)
 
     def get_dataset_info(self, id):
-        d = self.sqlquery('all_datasets', condition=f"id = {id}", limit=1, fetch='dict')
-        if d:
-            dd = {k: v[0] for k, v in d.items()}
-            return dd
-        return None
+        cur = self.sqlquery('all_datasets', condition="id = %s", exec_params=(id,), limit=1, fetch='records', prepare=True)
+        return cur.fetchone() if cur else None
 
     def get_data_by_dataset_id(self, ds_id, extended=False, **kwargs):
-        return self.sqlquery('all_data' if extended else 'data_lite', condition=f"ds_id = {ds_id}", **kwargs)
+        kwargs.setdefault('prepare', True)
+        return self.sqlquery('all_data' if extended else 'data_lite', condition="ds_id = %s", exec_params=(ds_id,), **kwargs)
+
+    ## Gets the column names of a table / view, querying the DB only on the first call
+    # (the DB schema only changes with migrations -- see refresh_schema()).
+    # @param table `str` table / view name
+    # @returns `list` of `tuple` (column_name,)
+    def _get_colnames(self, table):
+        cols = self._colnames_cache.get(table)
+        if cols is None:
+            cols = self._get_dbtables(columns='column_name::text', condition="table_name::name = %s", 
+                                      exec_params=(table,), fetch='list')
+            if cols is None: return None
+            self._colnames_cache[table] = cols
+        return list(cols)
+
+    ## Drops the cached column names (call after changing the DB schema).
+    def refresh_schema(self):
+        self._colnames_cache.clear()
 
     def get_colnames_datasets(self):
-        return self._get_dbtables(columns='column_name::text', condition="table_name::name = 'all_datasets'", fetch='list')
+        return self._get_colnames('all_datasets')
 
     def get_colnames_data(self):
-        return self._get_dbtables(columns='column_name::text', condition="table_name::name = 'data_lite'", fetch='list')
+        return self._get_colnames('data_lite')
 
     def get_colnames_data_extended(self):
-        return self._get_dbtables(columns='column_name::text', condition="table_name::name = 'all_data'", fetch='list')
+        return self._get_colnames('all_data')
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, Iskander Shafikov <s00mbre@gmail.com>
+# GNU General Public License v3.0+ (see LICENSE.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+# --------------------------------------------------------------- #
+
+## @package russtat.psdb_async
+# @brief Asynchronous (asyncio) read access to the Russtat PostgreSQL database.
+# Requires the [asyncpg](https://github.com/MagicStack/asyncpg) package.
+import asyncio
+import asyncpg
+from globs import report
+from psdb import Russtatdb
+
+# --------------------------------------------------------------- # 
+
+## @brief Asynchronous counterpart of psdb::Russtatdb for the read-only queries.
+# Queries are run over an asyncpg connection pool, so many of them can be awaited
+# concurrently from a single thread, e.g.
+# ```
+# async with AsyncRusstatdb(password='...') as db:
+#     datasets, data = await asyncio.gather(db.findin_datasets('заработная & плата'), 
+#                                           db.findin_data('безработица'))
+# ```
+class AsyncRusstatdb:
+
+    ## @param dbname `str` name / path of the Postgres DB on the server
+    # @param user `str` Postgres DB user name (default = 'postgres')
+    # @param password `str`|`None` Postgres DB password (default = `None`, means it is taken
+    # from the PGPASSWORD environment variable or the password file)
+    # @param host `str` Postgres DB server location (default = localhost)
+    # @param port `str` Postgres DB server port (default is 5432)
+    # @param min_size `int` number of connections the pool opens on connect
+    # @param max_size `int` maximum number of connections in the pool
+    # @param statement_cache_size `int` number of prepared statements each connection
+    # keeps in its LRU cache (0 = no caching)
+    def __init__(self, dbname='russtat', user='postgres', password=None, host='127.0.0.1', port='5432',
+                 min_size=1, max_size=10, statement_cache_size=500):
+        ## `asyncpg.Pool` DB connection pool (`None` if not connected)
+        self.pool = None
+        ## `dict` DB connection parameters
+        self._connparams = {'database': dbname, 'user': user, 'password': password, 'host': host, 'port': int(port)}
+        ## `int` minimum / maximum number of pooled connections
+        self.min_size, self.max_size = min_size, max_size
+        ## `int` size of the per-connection prepared statement cache
+        self.statement_cache_size = statement_cache_size
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    ## Creates the connection pool (if not yet created).
+    async def connect(self):
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(min_size=self.min_size, max_size=self.max_size, 
+                                                  statement_cache_size=self.statement_cache_size, **self._connparams)
+            report(f"Connected to {self._connparams['database']} as {self._connparams['user']} at {self._connparams['host']}:{self._connparams['port']}")
+
+    ## Closes all the pooled connections.
+    async def disconnect(self):
+        if self.pool is None: return
+        await self.pool.close()
+        self.pool = None
+        report(f"Disconnected from {self._connparams['database']}")
+
+    ## Runs a query on a pooled connection.
+    # @param sql `str` SQL query with `$1`, `$2`, ... placeholders for the arguments
+    # @param args query arguments
+    # @returns `list` of `asyncpg.Record` result rows
+    async def fetch(self, sql, *args):
+        await self.connect()
+        async with self.pool.acquire() as con:
+            return await con.fetch(sql, *args)
+
+    ## Full-text search in datasets -- see psdb::Russtatdb::findin_datasets().
+    async def findin_datasets(self, query):
+        return await self.fetch('select * from public.search_datasets($1::text);', query)
+
+    ## Full-text search in data -- see psdb::Russtatdb::findin_data().
+    async def findin_data(self, query):
+        return await self.fetch('select * from public.search_data($1::text);', query)
+
+    ## Runs several dataset searches concurrently over the pool.
+    # @param queries `iterable` of `str` search queries
+    # @returns `list` of search results in the order of `queries`
+    async def findin_datasets_many(self, queries):
+        return await asyncio.gather(*(self.findin_datasets(q) for q in queries))
+
+    ## Gets the classificator tree -- see psdb::Russtatdb::get_classificator().
+    async def get_classificator(self, ignore_root=True, max_levels=None):
+        rows = await self.fetch("select distinct classifier, id from public.all_datasets where classifier <> '' order by classifier;")
+        return Russtatdb.build_classificator(rows, ignore_root, max_levels)
@@ -344,19 +344,20 @@ class Russtat:
                             ei = val
                         elif concept == 'PERIOD':
                             per = val
-                except:
+                except AttributeError:
+                    # no Attributes node
                     per, ei = ('', '')
 
                 # year
                 try:
                     tim = int(self._get_text(item, ['generic:Obs', 'generic:Time'], '0'))
-                except:
+                except (ValueError, AttributeError):
                     tim = 0
 
                 # value
                 try:
                     val = float(self._get_attr(item, 'value', ['generic:Obs', 'generic:ObsValue'], '0.0').replace(',', '.').replace(' ', ''))
-                except:
+                except ValueError:
                     val = 0.0
 
                 # classifier and class
@@ -380,7 +381,7 @@ class Russtat:
                         n += 1
                         if max_row > 0 and n > max_row: break
                         
-                except:
+                except (AttributeError, KeyError, IndexError):
                     data.append(('', '', ei, per, tim, val))
                     n += 1
                     if max_row > 0 and n > max_row: break
@@ -600,8 +601,8 @@ class Russtat:
                         on_dataset(ds, **on_dataset_kwargs)
                     else:
                         on_dataset(ds)
-                except:
-                    pass
+                except Exception as err:
+                    report(err)
 
             if del_xml:
                 try:
@@ -5,17 +5,38 @@
 
 ## @package russtat.russtat
 # @brief Application entry point.
-import os, sys, json, traceback
+import os, sys, traceback
 from datetime import datetime
-from rsengine import Russtat
+from multiprocessing.util import Finalize
 from psdb import Russtatdb
-from globs import timeit
+from globs import timeit, to_json
 
 # --------------------------------------------------------------- #
 
+## `dict` DB connections opened by add2db() in the current (worker) process,
+# keyed by their connection parameters
+_worker_dbs = {}
+
+## Returns the DB connection of the current process for the given parameters,
+# creating it on first call so that each worker connects only once. Pool workers exit
+# through `os._exit()`, bypassing `atexit`, so the connection is closed by a
+# multiprocessing finalizer when the worker shuts down normally (pool closed and joined).
+# @param dbparams `dict` DB connection parameters passed to the `psdb::Russtatdb` constructor
+# @returns `psdb::Russtatdb` DB connection object
+def get_worker_db(dbparams):
+    key = tuple(sorted(dbparams.items()))
+    db = _worker_dbs.get(key)
+    if not db:
+        # a worker only ever uses one connection
+        db = Russtatdb(**{'minconn': 1, 'maxconn': 1, **dbparams})
+        Finalize(None, db.disconnect, exitpriority=10)
+        _worker_dbs[key] = db
+    return db
+
 ## Callback procedure for dataset processing: loads dataset into PSQL database.
 # @param ds `dict` The stats dataset as a dictionary object -- see rsengine::Russtat::get_one()
-# @param db `psdb::Russtatdb` | `None` DB connection object; may be `None` to connect locally
+# @param db `psdb::Russtatdb` | `None` DB connection object; may be `None` to use
+# the connection of the current process -- see get_worker_db()
 # @param dbparams `dict` DB connection parameters passed to the `psdb::Russtatdb` constructor
 # `None` means STDOUT, otherwise, a valid path is expected
 def add2db(ds, db=None, dbparams={}, logfile=None):   
@@ -29,16 +50,16 @@ def add2db(ds, db=None, dbparams={}, logfile=None):
         try:
             logfile = open(os.path.abspath(logfile), 'a', encoding='utf-8')
             closelog = True
-        except:
+        except OSError:
             logfile = sys.stdout
 
     try:
         if db is None:
-            # create DB object and connect with provided parameters
-            db = Russtatdb(**dbparams)
+            # reuse (or create) the DB connection of this process
+            db = get_worker_db(dbparams)
 
         # dump dataset to JSON string and pass into the server function 'add_data'
-        res = db.add_data(json.dumps(ds, ensure_ascii=False, default=str))
+        res = db.add_data(to_json(ds))
 
         # result must be a 3-tuple
         if res:
@@ -71,6 +92,9 @@ def add2db(ds, db=None, dbparams={}, logfile=None):
 # @param logfile `str` | `None` output file to print messages (`None` = STDOUT)
 @timeit
 def update_db(update_list=False, start_ds=0, end_ds=-1, skip_existing=True, pwd=None, disable_triggers=True, logfile=None): 
+    # the engine (and its 'requests' dependency) is only imported when updating
+    from rsengine import Russtat
+
     # create data retrieving engine
     update_list = int(update_list)
     rs = Russtat(update_list=update_list)
@@ -78,10 +102,8 @@ def update_db(update_list=False, start_ds=0, end_ds=-1, skip_existing=True, pwd=
     # ask DB password
     dbpassword = input('Enter DB password:') if pwd is None else pwd
 
-    # connect to DB
-    db = Russtatdb(password=dbpassword)    
-
-    try:
+    # connect to DB (disconnects on exit from the block)
+    with Russtatdb(password=dbpassword) as db:
         # start operation using multiple processes
         start_ds = int(start_ds)
         end_ds = int(end_ds)
@@ -99,7 +121,6 @@ def update_db(update_list=False, start_ds=0, end_ds=-1, skip_existing=True, pwd=
 
         if not datasets:
             print(f":: NO DATASETS TO UPDATE!")
-            db.disconnect()
             return
 
         # disable triggers to speed up process
@@ -136,9 +157,9 @@ def update_db(update_list=False, start_ds=0, end_ds=-1, skip_existing=True, pwd=
             if triggers_disabled: 
                 print(f":: Re-enabling DB triggers and updating vector indices...")
                 db.enable_triggers()
-
-    finally:
-        db.disconnect()
+            else:
+                print(f":: Refreshing dataset search index...")
+                db.refresh_search()
 
 def testing():
     dbpassword = input('Enter DB password:')